@@ -1,5 +1,6 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Query, Header
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
 from pathlib import Path
 from typing import List, Dict, Optional
 import time
@@ -10,6 +11,8 @@ from .storage import Storage
 from .watcher import FileWatcher
 from .activity_score import ActivityScorer
 from .process_detector import ProcessDetector
+from .snapshot import load_manifest, stream_snapshot
+from .rawlog import open_log, parse_range
 
 app = FastAPI(title="Agent Memory MCP")
 
@@ -39,6 +42,10 @@ class TextPayload(BaseModel):
     text: str
     metadata: Optional[Dict] = None
 
+class SimilarQuery(BaseModel):
+    text: str
+    limit: int = Field(5, ge=1, le=100)
+
 class WatcherConfig(BaseModel):
     paths: List[str]
     extensions: List[str]
@@ -49,7 +56,7 @@ def root():
     return {
         "name": "Agent Memory MCP",
         "status": "active",
-        "endpoints": ["/health", "/status", "/repos", "/memory/{repo_id}"]
+        "endpoints": ["/health", "/status", "/repos", "/memory/{repo_id}", "/memory/{repo_id}/query", "/memory/{repo_id}/raw-logs/{name}", "/failures/similar", "/snapshot"]
     }
 
 @app.get("/health")
@@ -72,6 +79,91 @@ def get_memory(repo_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/memory/{repo_id}/query")
+def query_memory(
+    repo_id: str,
+    kind: str = Query(..., pattern=r"^[A-Za-z0-9_-]+$"),
+    from_: Optional[float] = Query(None, alias="from"),
+    to: Optional[float] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    cursor: Optional[str] = None,
+):
+    try:
+        return store.query_memory(repo_id, kind, start=from_, end=to, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/failures/similar")
+def similar_failures(query: SimilarQuery):
+    return {"matches": store.similar_failures(query.text, query.limit)}
+
+@app.get("/memory/{repo_id}/raw-logs/{name}")
+def get_raw_log(
+    repo_id: str,
+    name: str,
+    lines: Optional[str] = Query(None, pattern=r"^\d+-\d+$"),
+    tail: Optional[int] = Query(None, ge=1),
+    around: Optional[str] = None,
+    context: int = Query(20, ge=0),
+    after: int = Query(0, ge=0),
+    range_header: Optional[str] = Header(None, alias="Range"),
+):
+    """
+    Serves a captured log without loading it: a byte Range, a line window
+    (`lines=120000-120200`, 1-based inclusive), the last `tail` lines, or
+    `context` lines either side of the first match of `around` after line `after`.
+    """
+    try:
+        view = open_log(store.raw_log_path(repo_id, name))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    headers = {"Accept-Ranges": "bytes"}
+    status_code = 200
+    try:
+        # Spans, sizes and the streamed bytes all come from the same mapping
+        with view.pinned():
+            if lines or tail or around:
+                if lines:
+                    first, last = (int(n) for n in lines.split("-"))
+                    if last < first:
+                        raise HTTPException(status_code=400, detail="Invalid line window")
+                    start, end = view.line_span(first, last)
+                elif tail:
+                    start, end = view.tail_span(tail)
+                    # Only known cheaply once the line index already reaches the tail
+                    first = view.indexed_line_number(start)
+                else:
+                    match = view.find_line(around.encode("utf-8"), after)
+                    if match is None:
+                        raise HTTPException(status_code=404, detail=f"No match for {around!r}")
+                    first = max(match - context, 1)
+                    start, end = view.line_span(first, match + context)
+                    headers["X-Match-Line"] = str(match)
+                if first is not None:
+                    headers["X-Line-Start"] = str(first)
+                headers["X-Byte-Range"] = f"{start}-{end}"
+            elif range_header:
+                try:
+                    start, end = parse_range(range_header, view.size)
+                except ValueError as e:
+                    raise HTTPException(
+                        status_code=416, detail=str(e), headers={"Content-Range": f"bytes */{view.size}"}
+                    )
+                headers["Content-Range"] = f"bytes {start}-{end - 1}/{view.size}"
+                headers["Content-Length"] = str(end - start)
+                status_code = 206
+            else:
+                start, end = 0, view.size
+                headers["Content-Length"] = str(view.size)
+            body = view.iter_bytes(start, end)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+    return StreamingResponse(body, status_code=status_code, media_type="text/plain", headers=headers)
+
 @app.post("/memory/{repo_id}/attempt")
 def add_attempt(repo_id: str, payload: TextPayload):
     store.append_memory(repo_id, "attempts", payload.text, payload.metadata)
@@ -87,6 +179,18 @@ def add_decision(repo_id: str, payload: TextPayload):
     store.append_memory(repo_id, "decisions", payload.text, payload.metadata)
     return {"ok": True}
 
+@app.get("/snapshot")
+def snapshot(since: Optional[str] = None):
+    try:
+        base = load_manifest(DATA_ROOT, since) if since else None
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    return StreamingResponse(
+        stream_snapshot(DATA_ROOT, base),
+        media_type="application/x-tar",
+        headers={"Content-Disposition": f'attachment; filename="agent-memory-{int(time.time())}.tar"'},
+    )
+
 @app.post("/watcher/start")
 def start_watcher(config: Optional[WatcherConfig] = None):
     global watcher, watcher_thread, scorer
@@ -97,7 +201,8 @@ def start_watcher(config: Optional[WatcherConfig] = None):
     watcher = FileWatcher(
         paths=cfg.get("paths", DEFAULT_CONFIG["watch_paths"]),
         extensions=cfg.get("extensions", DEFAULT_CONFIG["log_extensions"]),
-        ignore_patterns=cfg.get("ignore_patterns", DEFAULT_CONFIG["ignore_patterns"])
+        ignore_patterns=cfg.get("ignore_patterns", DEFAULT_CONFIG["ignore_patterns"]),
+        index_dir=DATA_ROOT / "watch-index"
     )
     
     heuristics = {
@@ -107,22 +212,35 @@ def start_watcher(config: Optional[WatcherConfig] = None):
     }
     scorer = ActivityScorer(heuristics)
     
+    def ingest(event: Path):
+        repo_id = store.resolve_repo(event)
+        if repo_id:
+            store.capture_raw_log(repo_id, event)
+            try:
+                content = event.read_text(errors="ignore").lower()
+                if "error" in content or "failed" in content:
+                    store.append_memory(repo_id, "failures", f"Detected error in {event.name}", {"path": str(event)})
+                else:
+                    store.append_memory(repo_id, "attempts", f"Detected activity in {event.name}", {"path": str(event)})
+            except Exception as e:
+                print(f"Error reading {event}: {e}")
+        watcher.mark_ingested(event)
+
     def watcher_loop():
-        watcher.start()
+        # Start live watching first so nothing slips in while the catch-up scan runs
+        if not watcher.start():
+            print("[API] Watcher failed to start")
+            return
         print("[API] Watcher loop started")
+        started = time.time()
+        queued = watcher.catch_up()
+        print(f"[API] Catch-up scan queued {queued} changed files in {time.time() - started:.2f}s")
         for event in watcher.events():
             scorer.record_fs_event()
-            repo_id = store.resolve_repo(event)
-            if repo_id:
-                store.capture_raw_log(repo_id, event)
-                try:
-                    content = event.read_text(errors="ignore").lower()
-                    if "error" in content or "failed" in content:
-                        store.append_memory(repo_id, "failures", f"Detected error in {event.name}", {"timestamp": time.ctime()})
-                    else:
-                        store.append_memory(repo_id, "attempts", f"Detected activity in {event.name}", {"timestamp": time.ctime()})
-                except Exception as e:
-                    print(f"Error reading {event}: {e}")
+            try:
+                ingest(event)
+            except Exception as e:
+                print(f"Error ingesting {event}: {e}")
 
     watcher_thread = threading.Thread(target=watcher_loop, daemon=True)
     watcher_thread.start()
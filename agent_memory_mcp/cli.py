@@ -1,6 +1,7 @@
 import argparse
 import sys
 from .main import run
+from .snapshot import load_manifest, restore_snapshot, save_manifest, write_snapshot
 
 def entry():
     parser = argparse.ArgumentParser(prog="agent-memory")
@@ -16,12 +17,36 @@ def entry():
     mcp_parser = subparsers.add_parser("mcp", help="Run as MCP stdio server")
     mcp_parser.add_argument("--root", default="~/agent_companion_data", help="Data root directory")
 
+    # Snapshot command
+    snap_parser = subparsers.add_parser("snapshot", help="Write a consistent archive of the data root")
+    snap_parser.add_argument("--root", default="~/agent_companion_data", help="Data root directory")
+    snap_parser.add_argument("--out", required=True, help="Archive path, or - for stdout")
+    snap_parser.add_argument("--since", help="Snapshot id (or 'latest') to make an incremental snapshot against")
+
+    # Restore command
+    restore_parser = subparsers.add_parser("restore", help="Restore snapshot archives into the data root")
+    restore_parser.add_argument("archives", nargs="+", help="Full snapshot followed by its incrementals, in order")
+    restore_parser.add_argument("--root", default="~/agent_companion_data", help="Data root directory")
+    restore_parser.add_argument("--workers", type=int, default=8, help="Repos restored in parallel")
+
     args = parser.parse_args()
 
     if args.command == "serve":
         run(mode="http", port=args.port, root=args.root)
     elif args.command == "mcp":
         run(mode="stdio", root=args.root)
+    elif args.command == "snapshot":
+        since = load_manifest(args.root, args.since) if args.since else None
+        if args.out == "-":
+            manifest = write_snapshot(args.root, sys.stdout.buffer, since)
+        else:
+            with open(args.out, "wb") as f:
+                manifest = write_snapshot(args.root, f, since)
+        save_manifest(args.root, manifest)
+        print(f"[SNAPSHOT] {manifest['id']}: {len(manifest['members'])} files", file=sys.stderr)
+    elif args.command == "restore":
+        count = restore_snapshot(args.root, args.archives, workers=args.workers)
+        print(f"[RESTORE] Restored {count} files into {args.root}", file=sys.stderr)
     else:
         parser.print_help()
 
@@ -0,0 +1,180 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+
+from .ignore import IgnoreMatcher
+
+# mtime_ns stored for files queued but not yet ingested, so they still count as changed after a restart
+PENDING = -1
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dir TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    offset INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (dir, name)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT) WITHOUT ROWID;
+"""
+
+
+def _scan_dir(path: str):
+    """Worker: lists one directory. Runs in a thread; scandir/stat release the GIL."""
+    files, dirs, has_gitignore = [], [], False
+    try:
+        with os.scandir(path) as it:
+            for e in it:
+                try:
+                    if e.is_dir(follow_symlinks=False):
+                        dirs.append(e.name)
+                    elif e.is_file(follow_symlinks=False):
+                        if e.name == ".gitignore":
+                            has_gitignore = True
+                        st = e.stat(follow_symlinks=False)
+                        files.append((e.name, st.st_mtime_ns, st.st_size, st.st_ino))
+                except OSError:
+                    continue
+    except OSError:
+        pass
+    return path, files, dirs, has_gitignore
+
+
+class FileIndex:
+    """
+    Persistent path -> (mtime, size, inode, offset) index for one watch root.
+
+    Lets the watcher find files that changed while the server was down
+    without re-ingesting the whole tree. Rows are keyed by (dir, name) so a
+    reconciliation only ever loads one directory's rows at a time.
+    """
+
+    def __init__(self, index_dir: str | Path, root: str | Path):
+        self.root = Path(root).expanduser().resolve()
+        index_dir = Path(index_dir).expanduser()
+        index_dir.mkdir(parents=True, exist_ok=True)
+        key = hashlib.sha1(str(self.root).encode()).hexdigest()[:10]
+        self.db_path = index_dir / f"{key}.sqlite"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('root', ?)", (str(self.root),))
+        self._db.commit()
+
+    def _seeded(self) -> bool:
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'seeded'").fetchone()
+        return row is not None
+
+    def reconcile(self, matcher: IgnoreMatcher, extensions: set, workers: int = 8) -> List[Path]:
+        """
+        Walks the root in parallel and returns files whose mtime, size or inode
+        differ from the index. The first run only seeds the index, since there
+        is no earlier state to compare against. After that, only mark_ingested
+        records a file's new stat, so a change survives a restart until it has
+        actually been ingested.
+        """
+        changed: List[Path] = []
+        visited = set()
+        root = str(self.root)
+
+        results: queue.Queue = queue.Queue()
+        outstanding = 0
+
+        with self._lock, ThreadPoolExecutor(max_workers=workers) as pool:
+            if self._db is None:
+                return changed
+            seeded = self._seeded()
+
+            def submit(path: str):
+                nonlocal outstanding
+                outstanding += 1
+                pool.submit(_scan_dir, path).add_done_callback(results.put)
+
+            submit(root)
+            while outstanding:
+                outstanding -= 1
+                d, files, dirs, has_gitignore = results.get().result()
+                visited.add(d)
+                rel_dir = os.path.relpath(d, root)
+                prefix = "" if rel_dir == "." else rel_dir.replace(os.sep, "/") + "/"
+                if has_gitignore and d != root:
+                    matcher.add_gitignore(Path(d) / ".gitignore")
+
+                for name in dirs:
+                    if not matcher.is_ignored_entry(prefix + name, True):
+                        submit(os.path.join(d, name))
+
+                known = {
+                    name: (mtime_ns, size, inode)
+                    for name, mtime_ns, size, inode in self._db.execute(
+                        "SELECT name, mtime_ns, size, inode FROM files WHERE dir = ?", (d,)
+                    )
+                }
+                rows = []
+                for name, mtime_ns, size, inode in files:
+                    if os.path.splitext(name)[1] not in extensions:
+                        continue
+                    if matcher.is_ignored_entry(prefix + name, False):
+                        continue
+                    stored = known.pop(name, None)
+                    if stored == (mtime_ns, size, inode):
+                        continue
+                    if not seeded:
+                        rows.append((d, name, mtime_ns, size, inode))
+                        continue
+                    changed.append(Path(d) / name)
+                    # Changed rows keep their old stat until mark_ingested; new ones are pending
+                    if stored is None:
+                        rows.append((d, name, PENDING, size, inode))
+                if rows:
+                    self._db.executemany(
+                        "INSERT OR IGNORE INTO files (dir, name, mtime_ns, size, inode, offset) "
+                        "VALUES (?, ?, ?, ?, ?, 0)",
+                        rows,
+                    )
+                if known:
+                    self._db.executemany(
+                        "DELETE FROM files WHERE dir = ? AND name = ?", [(d, n) for n in known]
+                    )
+
+            # Directories that disappeared (or became ignored) since the last run
+            gone = [
+                d for (d,) in self._db.execute("SELECT DISTINCT dir FROM files") if d not in visited
+            ]
+            self._db.executemany("DELETE FROM files WHERE dir = ?", [(d,) for d in gone])
+            self._db.execute("INSERT OR REPLACE INTO meta VALUES ('seeded', '1')")
+            self._db.commit()
+
+        return changed
+
+    def mark_ingested(self, path: str | Path, offset: Optional[int] = None):
+        """Records the current stat of `path` and how far into it has been ingested."""
+        path = Path(path)
+        try:
+            st = path.stat()
+        except OSError:
+            return
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.execute(
+                "INSERT OR REPLACE INTO files (dir, name, mtime_ns, size, inode, offset) VALUES (?, ?, ?, ?, ?, ?)",
+                (str(path.parent), path.name, st.st_mtime_ns, st.st_size, st.st_ino,
+                 st.st_size if offset is None else offset),
+            )
+            self._db.commit()
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
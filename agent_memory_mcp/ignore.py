@@ -0,0 +1,151 @@
+from pathlib import Path
+from typing import Iterable, List, Optional, Tuple
+import re
+
+
+def _translate(glob: str) -> str:
+    """Translates a single gitignore glob (no slashes) into a regex body."""
+    out = []
+    i, n = 0, len(glob)
+    while i < n:
+        c = glob[i]
+        if c == "*":
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            j = glob.find("]", i + 1)
+            if j == -1:
+                out.append(re.escape(c))
+            else:
+                body = glob[i + 1:j]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append(f"[{body}]")
+                i = j
+        elif c == "\\" and i + 1 < n:
+            i += 1
+            out.append(re.escape(glob[i]))
+        else:
+            out.append(re.escape(c))
+        i += 1
+    return "".join(out)
+
+
+class _Rule:
+    __slots__ = ("negate", "dir_only", "name", "regex")
+
+    def __init__(self, pattern: str):
+        self.negate = pattern.startswith("!")
+        if self.negate:
+            pattern = pattern[1:]
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+
+        # Plain component names ("node_modules", ".venv") are the common case
+        # and are matched with a string compare instead of a regex.
+        self.name = None
+        self.regex = None
+        if not anchored and not any(ch in pattern for ch in "*?[\\"):
+            self.name = pattern
+            return
+
+        parts = []
+        for seg in pattern.split("/"):
+            if seg == "**":
+                parts.append("(?:.*/)?")
+            else:
+                parts.append(_translate(seg) + "/")
+        body = "".join(parts).rstrip("/")
+        if body.endswith("(?:.*/)?"):
+            body = body[: -len("(?:.*/)?")] + ".*"
+        if not anchored:
+            body = "(?:.*/)?" + body
+        self.regex = re.compile(body + r"\Z")
+
+    def matches(self, rel: str, name: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.name is not None:
+            return name == self.name
+        return self.regex.match(rel) is not None
+
+
+class IgnoreMatcher:
+    """
+    Precompiled ignore rules for a single watch root.
+
+    Combines the configured patterns with the root's .gitignore (and nested
+    .gitignore files added via `add_gitignore`). Paths are matched component
+    by component relative to the root, so an ignored directory prunes its
+    whole subtree.
+    """
+
+    def __init__(self, root: str | Path, patterns: Optional[Iterable[str]] = None, use_gitignore: bool = True):
+        self.root = Path(root).expanduser()
+        self._rules: List[Tuple[str, _Rule]] = []
+        self._loaded = set()
+        for p in patterns or ():
+            self._add("", p)
+        if use_gitignore:
+            self.add_gitignore(self.root / ".gitignore")
+
+    def _add(self, base: str, line: str):
+        line = line.rstrip("\n").rstrip()
+        if not line or line.startswith("#"):
+            return
+        if line.startswith("\\#") or line.startswith("\\!"):
+            line = line[1:]
+        self._rules.append((base, _Rule(line)))
+
+    def add_gitignore(self, path: str | Path):
+        """Loads rules from a .gitignore; they apply below its directory."""
+        path = Path(path)
+        if path in self._loaded:
+            return
+        self._loaded.add(path)
+        try:
+            lines = path.read_text(encoding="utf-8", errors="ignore").splitlines()
+        except OSError:
+            return
+        try:
+            base = path.parent.relative_to(self.root).as_posix()
+        except ValueError:
+            return
+        base = "" if base == "." else base + "/"
+        for line in lines:
+            self._add(base, line)
+
+    def _match_rel(self, rel: str, is_dir: bool) -> bool:
+        name = rel.rsplit("/", 1)[-1]
+        ignored = False
+        for base, rule in self._rules:
+            if base:
+                if not rel.startswith(base):
+                    continue
+                sub = rel[len(base):]
+            else:
+                sub = rel
+            if rule.negate == ignored and rule.matches(sub, name, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def is_ignored(self, path: str | Path, is_dir: bool = False) -> bool:
+        """True if `path` or any of its parent directories is ignored."""
+        try:
+            rel = Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return False
+        if rel == ".":
+            return False
+        parts = rel.split("/")
+        for i in range(1, len(parts)):
+            if self._match_rel("/".join(parts[:i]), True):
+                return True
+        return self._match_rel(rel, is_dir)
+
+    def is_ignored_entry(self, rel: str, is_dir: bool) -> bool:
+        """Checks a single entry whose parents are already known to be kept."""
+        return self._match_rel(rel, is_dir)
@@ -0,0 +1,173 @@
+"""
+Single-instance inotify observer.
+
+watchdog's Observer starts a separate emitter, with its own thread and its
+own inotify instance, for every scheduled path, so one non-recursive watch per
+directory quickly runs into the per-user instance limit (128 by default).
+InotifyObserver puts every directory on one inotify instance, with one
+watch descriptor each, and dispatches watchdog events to the scheduled
+handlers. It implements the small subset of the Observer API FileWatcher uses.
+
+When the kernel queue overflows, events (including directory creations
+and deletions) are lost, so the observer calls `on_overflow` and leaves it
+to the owner to rescan.
+"""
+from watchdog.events import DirCreatedEvent, DirDeletedEvent, FileModifiedEvent
+from typing import Callable, Dict, Optional, Set
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+IN_NONBLOCK = 0o4000
+
+WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_ONLYDIR
+EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+    except OSError:
+        return None
+    if not hasattr(libc, "inotify_init1"):
+        return None
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+_libc = _load_libc()
+
+
+def available() -> bool:
+    return _libc is not None
+
+
+class InotifyObserver:
+    def __init__(self, on_overflow: Optional[Callable[[], None]] = None):
+        if _libc is None:
+            raise OSError(errno.ENOSYS, "inotify is not available")
+        self._fd = _libc.inotify_init1(IN_CLOEXEC | IN_NONBLOCK)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1: {os.strerror(err)}")
+        self._lock = threading.Lock()
+        self._paths: Dict[int, bytes] = {}
+        self._handlers: Dict[int, object] = {}
+        self._stop_r, self._stop_w = os.pipe()
+        self._thread: Optional[threading.Thread] = None
+        self.on_overflow = on_overflow
+
+    def schedule(self, handler, path: str, recursive: bool = False) -> int:
+        """Adds a watch on one directory; `recursive` is accepted for API parity but ignored."""
+        raw = os.fsencode(path)
+        wd = _libc.inotify_add_watch(self._fd, raw, WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch {path}: {os.strerror(err)}")
+        with self._lock:
+            self._paths[wd] = raw
+            self._handlers[wd] = handler
+        return wd
+
+    def unschedule(self, wd: int):
+        with self._lock:
+            if self._paths.pop(wd, None) is None:
+                return
+            self._handlers.pop(wd, None)
+        _libc.inotify_rm_watch(self._fd, wd)
+
+    def watches(self) -> Set[int]:
+        """Watch descriptors still live; the kernel drops a watch when its directory goes away."""
+        with self._lock:
+            return set(self._paths)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="inotify-observer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        os.write(self._stop_w, b"x")
+
+    def join(self, timeout: Optional[float] = None):
+        if self._thread:
+            self._thread.join(timeout)
+        for fd in (self._fd, self._stop_r, self._stop_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def _run(self):
+        while True:
+            ready, _, _ = select.select([self._fd, self._stop_r], [], [])
+            if self._stop_r in ready:
+                return
+            try:
+                buf = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            self._dispatch(buf)
+
+    def _dispatch(self, buf: bytes):
+        pos = 0
+        overflowed = False
+        while pos + EVENT_HEADER.size <= len(buf):
+            wd, mask, _cookie, length = EVENT_HEADER.unpack_from(buf, pos)
+            name = buf[pos + EVENT_HEADER.size:pos + EVENT_HEADER.size + length].rstrip(b"\0")
+            pos += EVENT_HEADER.size + length
+
+            if mask & IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            with self._lock:
+                base = self._paths.get(wd)
+                handler = self._handlers.get(wd)
+                if mask & (IN_IGNORED | IN_DELETE_SELF):
+                    self._paths.pop(wd, None)
+                    self._handlers.pop(wd, None)
+            if base is None or handler is None or not name:
+                continue
+
+            path = os.fsdecode(os.path.join(base, name))
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    event = DirCreatedEvent(path)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    event = DirDeletedEvent(path)
+                else:
+                    continue
+            elif mask & IN_MODIFY:
+                event = FileModifiedEvent(path)
+            else:
+                continue
+            try:
+                handler.dispatch(event)
+            except Exception as e:
+                print(f"[WATCHER] Handler error for {path}: {e}")
+
+        if overflowed:
+            print("[WATCHER] inotify queue overflowed; some events were dropped")
+            if self.on_overflow:
+                try:
+                    self.on_overflow()
+                except Exception as e:
+                    print(f"[WATCHER] Overflow handler error: {e}")
@@ -77,6 +77,18 @@ class MCPServer:
                                     },
                                     "required": ["repo_path", "kind", "text"]
                                 }
+                            },
+                            {
+                                "name": "similar_failures",
+                                "description": "Find past failures similar to this one across all repos, with the decisions recorded after them",
+                                "inputSchema": {
+                                    "type": "object",
+                                    "properties": {
+                                        "text": {"type": "string"},
+                                        "limit": {"type": "integer", "default": 5, "minimum": 1, "maximum": 100}
+                                    },
+                                    "required": ["text"]
+                                }
                             }
                         ]
                     }
@@ -87,6 +99,10 @@ class MCPServer:
                         rid = self.store.resolve_repo(args["repo_path"])
                         self.store.append_memory(rid, args["kind"], args["text"])
                         result = {"content": [{"type": "text", "text": "Memory added"}]}
+                    elif tool == "similar_failures":
+                        limit = min(max(int(args.get("limit", 5)), 1), 100)
+                        matches = self.store.similar_failures(args["text"], limit)
+                        result = {"content": [{"type": "text", "text": json.dumps(matches, indent=2)}]}
                     else:
                         result = {"error": "Tool not found"}
                 else:
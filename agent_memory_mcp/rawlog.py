@@ -0,0 +1,195 @@
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional, Tuple
+import mmap
+import threading
+
+# The newline index keeps one cumulative count per BLOCK bytes, so it costs
+# ~32 KB per GB of log; positions inside a block are found by scanning it.
+BLOCK = 256 * 1024
+STREAM_CHUNK = 64 * 1024
+MAX_OPEN = 32
+
+
+class LogView:
+    """
+    Memory-mapped, line-addressable view of one captured log.
+
+    The newline index is built lazily, only as far as a request needs, and
+    extended when the file grows. If the file is replaced (new inode) or
+    truncated, the view is remapped and the index rebuilt. Requests work
+    inside `pinned()`, so the spans they compute and the bytes they stream
+    come from the same mapping.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.RLock()
+        self._ino = None
+        self.size = 0
+        self._mm: Optional[mmap.mmap] = None
+        self._cum = array("Q")
+
+    def refresh(self):
+        with self._lock:
+            st = self.path.stat()
+            if st.st_ino == self._ino and st.st_size == self.size:
+                return
+            if st.st_ino != self._ino or st.st_size < self.size:
+                self._cum = array("Q")
+            self._ino, self.size = st.st_ino, st.st_size
+            self._mm = None
+            if self.size:
+                with open(self.path, "rb") as f:
+                    self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self.size = len(self._mm)
+                # Only whole blocks are indexed; a grown tail block is recounted
+                del self._cum[self.size // BLOCK:]
+
+    @contextmanager
+    def pinned(self):
+        """Refreshes the mapping and holds it steady for the duration of the block."""
+        with self._lock:
+            self.refresh()
+            yield self
+
+    def _extend(self, until_block: Optional[int] = None, until_count: Optional[int] = None):
+        """Indexes whole blocks up to `until_block`, or until `until_count` newlines are covered."""
+        full = self.size // BLOCK
+        limit = full if until_block is None else min(until_block, full)
+        with self._lock:
+            while len(self._cum) < limit:
+                if until_count is not None and self._cum and self._cum[-1] >= until_count:
+                    break
+                i = len(self._cum)
+                prev = self._cum[-1] if i else 0
+                self._cum.append(prev + self._mm[i * BLOCK:(i + 1) * BLOCK].count(b"\n"))
+
+    def _newlines_before(self, pos: int) -> int:
+        block = pos // BLOCK
+        self._extend(until_block=block)
+        base = self._cum[block - 1] if block else 0
+        return base + self._mm[block * BLOCK:pos].count(b"\n")
+
+    def _nth_newline(self, n: int) -> Optional[int]:
+        """Byte offset of the n-th newline (1-based), or None if the file has fewer."""
+        if n <= 0 or self._mm is None:
+            return None
+        self._extend(until_count=n)
+        # First indexed block whose cumulative count reaches n, else the unindexed tail
+        lo, hi = 0, len(self._cum)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._cum[mid] >= n:
+                hi = mid
+            else:
+                lo = mid + 1
+        block = lo
+        seen = self._cum[block - 1] if block else 0
+        pos = block * BLOCK
+        end = min((block + 1) * BLOCK, self.size) if block < len(self._cum) else self.size
+        while seen < n:
+            pos = self._mm.find(b"\n", pos, end)
+            if pos == -1:
+                return None
+            seen += 1
+            pos += 1
+        return pos - 1
+
+    def total_lines(self) -> int:
+        if self._mm is None:
+            return 0
+        count = self._newlines_before(self.size)
+        return count + (0 if self._mm[self.size - 1:self.size] == b"\n" else 1)
+
+    def line_span(self, first: int, last: int) -> Tuple[int, int]:
+        """Byte range [start, end) covering lines first..last (1-based, inclusive)."""
+        if self._mm is None:
+            return 0, 0
+        first = max(first, 1)
+        start = 0 if first == 1 else self._nth_newline(first - 1)
+        if start is None:
+            return self.size, self.size
+        start = start + 1 if first > 1 else 0
+        end = self._nth_newline(last)
+        return start, self.size if end is None else end + 1
+
+    def tail_span(self, n: int) -> Tuple[int, int]:
+        """Byte range of the last `n` lines, found by scanning back from EOF."""
+        mm = self._mm
+        if mm is None:
+            return 0, 0
+        pos = self.size - 1 if mm[self.size - 1:self.size] == b"\n" else self.size
+        for _ in range(n):
+            pos = mm.rfind(b"\n", 0, pos)
+            if pos == -1:
+                return 0, self.size
+        return pos + 1, self.size
+
+    def indexed_line_number(self, pos: int) -> Optional[int]:
+        """Line number at byte `pos` if the index already reaches it, without extending it."""
+        if self._mm is None:
+            return None
+        block = pos // BLOCK
+        if block > len(self._cum):
+            return None
+        return self._newlines_before(pos) + 1
+
+    def find_line(self, needle: bytes, after_line: int = 0) -> Optional[int]:
+        """Line number (1-based) of the first occurrence of `needle` after `after_line`."""
+        if self._mm is None or not needle:
+            return None
+        start = 0
+        if after_line > 0:
+            start, _ = self.line_span(after_line + 1, after_line + 1)
+        pos = self._mm.find(needle, start)
+        if pos == -1:
+            return None
+        return self._newlines_before(pos) + 1
+
+    def iter_bytes(self, start: int, end: int) -> Iterator[bytes]:
+        """Returns a chunk iterator bound to the current mapping, even if the view is remapped later."""
+        mm = self._mm
+        if mm is None:
+            return iter(())
+        end = min(end, len(mm))
+
+        def chunks():
+            for pos in range(start, end, STREAM_CHUNK):
+                yield mm[pos:min(pos + STREAM_CHUNK, end)]
+        return chunks()
+
+
+_views: "OrderedDict[Path, LogView]" = OrderedDict()
+_views_lock = threading.Lock()
+
+
+def open_log(path: str | Path) -> LogView:
+    """Returns the cached view of `path`, keeping at most MAX_OPEN views; use it via `pinned()`."""
+    path = Path(path)
+    with _views_lock:
+        view = _views.pop(path, None) or LogView(path)
+        _views[path] = view
+        while len(_views) > MAX_OPEN:
+            _views.popitem(last=False)
+    return view
+
+
+def parse_range(header: str, size: int) -> Tuple[int, int]:
+    """Parses a single-range `bytes=` header into [start, end). Raises ValueError if unsatisfiable."""
+    unit, _, spec = header.partition("=")
+    if unit.strip() != "bytes" or "," in spec:
+        raise ValueError("Only a single bytes range is supported")
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        n = int(last)
+        if n <= 0:
+            raise ValueError("Empty suffix range")
+        return max(size - n, 0), size
+    start = int(first)
+    end = int(last) + 1 if last else size
+    if start >= size or end <= start:
+        raise ValueError("Range not satisfiable")
+    return start, min(end, size)
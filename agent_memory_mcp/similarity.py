@@ -0,0 +1,142 @@
+from pathlib import Path
+from typing import Any, Dict, List
+import hashlib
+import json
+import re
+import threading
+
+BITS = 64
+BANDS = 4
+BAND_BITS = BITS // BANDS
+BAND_MASK = (1 << BAND_BITS) - 1
+
+_NOISE = [
+    (re.compile(r"(?:[a-zA-Z]:)?(?:[\w.-]*[/\\])+[\w.-]+"), " <path> "),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-f]{7,}\b"), " <hex> "),
+    (re.compile(r"\d+"), " <n> "),
+]
+_TOKEN = re.compile(r"<\w+>|\w+")
+
+
+def _features(text: str) -> List[str]:
+    """Tokens and token bigrams, with paths, hashes and numbers collapsed."""
+    text = text.lower()
+    for pattern, repl in _NOISE:
+        text = pattern.sub(repl, text)
+    tokens = _TOKEN.findall(text)
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def simhash(text: str) -> int:
+    weights = [0] * BITS
+    for feature in _features(text):
+        h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+        for bit in range(BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = 0
+    for bit, w in enumerate(weights):
+        if w > 0:
+            value |= 1 << bit
+    return value
+
+
+def _bands(h: int) -> List[int]:
+    return [(h >> (i * BAND_BITS)) & BAND_MASK for i in range(BANDS)]
+
+
+def _entry(repo_id: str, record: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "repo_id": repo_id,
+        "id": record["id"],
+        "ts": record["ts"],
+        "simhash": f"{simhash(record['text']):016x}",
+        "text": record["text"][:500],
+    }
+
+
+class FailureIndex:
+    """
+    Global SimHash index over failure texts from every repo.
+
+    Fingerprints are split into 4 bands of 16 bits; a lookup probes each band's
+    bucket plus every 1-bit neighbour of it, which finds all entries within
+    Hamming distance 7 without scanning the index. Entries are appended to a
+    JSONL file shared by all server processes and new lines are picked up on
+    the next lookup.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._entries: List[Dict[str, Any]] = []
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(BANDS)]
+        self._offset = 0
+
+    def _load_new(self):
+        """Indexes lines appended since the last call (by this or another process)."""
+        if not self.path.exists():
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                self._offset += len(line)
+                try:
+                    self._insert(json.loads(line))
+                except (ValueError, KeyError):
+                    continue
+
+    def _insert(self, entry: Dict[str, Any]):
+        idx = len(self._entries)
+        self._entries.append(entry)
+        for band, bucket in zip(_bands(int(entry["simhash"], 16)), self._buckets):
+            bucket.setdefault(band, []).append(idx)
+
+    def add(self, repo_id: str, record: Dict[str, Any]):
+        entry = _entry(repo_id, record)
+        with self._lock:
+            self._load_new()
+            with open(self.path, "ab") as f:
+                f.write(json.dumps(entry).encode("utf-8") + b"\n")
+            self._load_new()
+
+    def search(self, text: str, limit: int = 5, max_distance: int = 7) -> List[Dict[str, Any]]:
+        """Returns up to `limit` indexed failures nearest to `text`, closest first."""
+        h = simhash(text)
+        candidates = set()
+        with self._lock:
+            self._load_new()
+            for band, bucket in zip(_bands(h), self._buckets):
+                for probe in [band] + [band ^ (1 << b) for b in range(BAND_BITS)]:
+                    candidates.update(bucket.get(probe, ()))
+            entries = [self._entries[i] for i in candidates]
+
+        scored = []
+        for entry in entries:
+            distance = bin(h ^ int(entry["simhash"], 16)).count("1")
+            if distance <= max_distance:
+                scored.append((distance, -entry["ts"], entry))
+        scored.sort(key=lambda s: s[:2])
+        return [
+            {**entry, "distance": distance, "similarity": round(1 - distance / BITS, 3)}
+            for distance, _, entry in scored[:limit]
+        ]
+
+    def backfill(self, memory_dir: Path):
+        """Builds the index from existing failures.jsonl logs when it does not exist yet."""
+        with self._lock:
+            if self.path.exists():
+                return
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "wb") as out:
+                for log in sorted(Path(memory_dir).glob("*/memory/failures.jsonl")):
+                    repo_id = log.parent.parent.name
+                    with open(log, "rb") as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                            except ValueError:
+                                continue
+                            out.write(json.dumps(_entry(repo_id, record)).encode("utf-8") + b"\n")
+            tmp.replace(self.path)
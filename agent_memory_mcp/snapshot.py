@@ -0,0 +1,413 @@
+"""
+Consistent, streamable snapshots of the data root.
+
+An archive is an uncompressed outer tar holding:
+- root.tar.gz: files outside agent-memory/<repo_id>/ (repos.json, indexes)
+- repos/<repo_id>.tar.gz: one compressed blob per repo
+- manifest.json, last: the file states captured and what each member contains
+
+Append-only files (.jsonl, .md, .idx) are captured up to the size they had
+when the snapshot started, trimmed to a record boundary, so writers can keep
+appending while it runs. Everything else is replaced atomically by Storage.
+Files are opened one at a time while their blob is built; if one was
+replaced since planning (new inode), whatever file is opened is archived
+whole and the manifest, written last, records what was actually captured.
+Incremental snapshots only carry files that changed since a previous
+manifest, and for append-only files only the bytes appended since then.
+Restores check that each incremental sits on top of the state being restored.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+import io
+import json
+import os
+import queue
+import tarfile
+import tempfile
+import threading
+import time
+
+from .storage import INDEX_RECORD
+
+APPEND_ONLY = {".jsonl", ".md", ".idx"}
+EXCLUDED = {"watch-index", "snapshots"}
+CHUNK = 1 << 20
+
+
+def _append_only(rel: str) -> bool:
+    # Captured raw logs are replaced wholesale, whatever their suffix
+    return Path(rel).suffix in APPEND_ONLY and "/raw-logs/" not in rel
+
+
+def _group(rel: str) -> str:
+    parts = rel.split("/")
+    if parts[0] == "agent-memory" and len(parts) > 2:
+        return f"repos/{parts[1]}.tar.gz"
+    return "root.tar.gz"
+
+
+def _readable_size(path: Path, f, size: int) -> int:
+    """Trims an append-only file's captured size back to its last complete record."""
+    if path.suffix == ".idx":
+        return size - size % INDEX_RECORD.size
+    pos = size
+    while pos > 0:
+        step = min(CHUNK, pos)
+        f.seek(pos - step)
+        buf = f.read(step)
+        nl = buf.rfind(b"\n")
+        if nl != -1:
+            return pos - step + nl + 1
+        pos -= step
+    return 0
+
+
+def _plan(root: Path, since: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Records the size and inode of every file and decides what to archive.
+    Only files deleted mid-walk are skipped; any other error aborts the
+    snapshot rather than silently leaving files out of the manifest.
+    """
+    files: Dict[str, Dict[str, int]] = {}
+    members: Dict[str, Dict[str, int]] = {}
+    previous = since["files"] if since else {}
+
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        if Path(dirpath) == root:
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDED]
+        for name in filenames:
+            if not name.endswith(".tmp"):
+                paths.append(Path(dirpath) / name)
+    # Capture sparse indexes before their logs, so checkpoints never point past the logged data
+    paths.sort(key=lambda p: p.suffix != ".idx")
+
+    for path in paths:
+        rel = path.relative_to(root).as_posix()
+        append_only = _append_only(rel)
+        try:
+            if append_only:
+                with open(path, "rb") as f:
+                    st = os.fstat(f.fileno())
+                    size = _readable_size(path, f, st.st_size)
+            else:
+                st = path.stat()
+                size = st.st_size
+        except FileNotFoundError:
+            continue
+        files[rel] = {"size": size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+
+        prev = previous.get(rel)
+        if prev and prev["size"] == size and prev["ino"] == st.st_ino and (
+            append_only or prev["mtime_ns"] == st.st_mtime_ns
+        ):
+            continue
+        offset = 0
+        if prev and append_only and prev["ino"] == st.st_ino and prev["size"] <= size:
+            offset = prev["size"]
+        members[rel] = {"offset": offset, "size": size - offset}
+
+    return {"files": files, "members": members}
+
+
+def _build_blob(root: Path, rels: List[str], plan: Dict[str, Any]):
+    """
+    Archives `rels` into one gzip blob, opening one file at a time. If a file
+    was replaced since planning, it is captured whole and `plan` is updated;
+    if it was deleted it is dropped from `plan`.
+    """
+    files, members = plan["files"], plan["members"]
+    blob = tempfile.SpooledTemporaryFile(max_size=64 * CHUNK)
+    with tarfile.open(fileobj=blob, mode="w:gz") as tar:
+        for rel in rels:
+            path = root / rel
+            try:
+                f = open(path, "rb")
+            except FileNotFoundError:
+                del members[rel], files[rel]
+                continue
+            with f:
+                st = os.fstat(f.fileno())
+                planned = files[rel]
+                append_only = _append_only(rel)
+                # Inode numbers get reused, so a replaced file is also caught by its
+                # mtime (rewrites) or by having shrunk (append-only files)
+                if st.st_ino != planned["ino"] or (
+                    st.st_size < planned["size"] if append_only else st.st_mtime_ns != planned["mtime_ns"]
+                ):
+                    size = st.st_size
+                    if append_only:
+                        size = _readable_size(path, f, size)
+                    files[rel] = {"size": size, "mtime_ns": st.st_mtime_ns, "ino": st.st_ino}
+                    members[rel] = {"offset": 0, "size": size}
+                m = members[rel]
+                info = tarfile.TarInfo(rel)
+                info.size = m["size"]
+                info.mtime = time.time()
+                f.seek(m["offset"])
+                tar.addfile(info, _Bounded(f, m["size"]))
+    blob.seek(0, os.SEEK_END)
+    size = blob.tell()
+    blob.seek(0)
+    return blob, size
+
+
+def write_snapshot(root: str | Path, out, since: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Streams a snapshot of `root` to the writable file object `out` and returns
+    its manifest. Pass a previous manifest as `since` for an incremental one.
+    """
+    root = Path(root).expanduser()
+    plan = _plan(root, since)
+    created = time.time()
+
+    groups: Dict[str, List[str]] = {}
+    for rel in plan["members"]:
+        groups.setdefault(_group(rel), []).append(rel)
+
+    with tarfile.open(fileobj=out, mode="w|") as tar:
+        for name, rels in sorted(groups.items()):
+            blob, size = _build_blob(root, rels, plan)
+            with blob:
+                info = tarfile.TarInfo(name)
+                info.size = size
+                info.mtime = created
+                tar.addfile(info, blob)
+
+        manifest = {
+            "id": time.strftime("%Y%m%dT%H%M%S", time.localtime(created)) + f"-{int(created * 1000) % 1000:03d}",
+            "created": created,
+            "base": since["id"] if since else None,
+            **plan,
+        }
+        data = json.dumps(manifest).encode("utf-8")
+        info = tarfile.TarInfo("manifest.json")
+        info.size = len(data)
+        info.mtime = created
+        tar.addfile(info, io.BytesIO(data))
+    return manifest
+
+
+def save_manifest(root: str | Path, manifest: Dict[str, Any]):
+    snap_dir = Path(root).expanduser() / "snapshots"
+    snap_dir.mkdir(parents=True, exist_ok=True)
+    tmp = snap_dir / f"{manifest['id']}.json.tmp"
+    tmp.write_text(json.dumps(manifest))
+    tmp.replace(snap_dir / f"{manifest['id']}.json")
+
+
+def load_manifest(root: str | Path, snapshot_id: str) -> Dict[str, Any]:
+    """Loads a manifest saved by an earlier snapshot; `latest` picks the newest one."""
+    snap_dir = Path(root).expanduser() / "snapshots"
+    if snapshot_id == "latest":
+        saved = sorted(snap_dir.glob("*.json")) if snap_dir.exists() else []
+        if not saved:
+            raise FileNotFoundError("No previous snapshot found")
+        path = saved[-1]
+    else:
+        path = snap_dir / f"{Path(snapshot_id).name}.json"
+        if not path.exists():
+            raise FileNotFoundError(f"Unknown snapshot: {snapshot_id}")
+    return json.loads(path.read_text())
+
+
+class _Cancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    def __init__(self, q: queue.Queue, cancel: threading.Event):
+        self.q = q
+        self.cancel = cancel
+
+    def write(self, data: bytes) -> int:
+        data = bytes(data)
+        while True:
+            if self.cancel.is_set():
+                raise _Cancelled()
+            try:
+                self.q.put(data, timeout=0.5)
+                return len(data)
+            except queue.Full:
+                continue
+
+    def flush(self):
+        pass
+
+
+def stream_snapshot(root: str | Path, since: Optional[Dict[str, Any]] = None) -> Iterator[bytes]:
+    """
+    Yields a snapshot archive chunk by chunk, building it in a background
+    thread. Closing the generator early (client disconnect) stops the builder,
+    and the manifest is only saved once the last chunk has been consumed.
+    """
+    q: queue.Queue = queue.Queue(maxsize=64)
+    cancel = threading.Event()
+    done = object()
+    result: Dict[str, Any] = {}
+
+    def produce():
+        try:
+            result["manifest"] = write_snapshot(root, _QueueWriter(q, cancel), since)
+        except _Cancelled:
+            return
+        except Exception as e:
+            result["error"] = e
+        # The consumer stops reading once cancelled, so never block on the sentinel
+        while not cancel.is_set():
+            try:
+                q.put(done, timeout=0.5)
+                return
+            except queue.Full:
+                continue
+
+    threading.Thread(target=produce, daemon=True).start()
+    try:
+        while True:
+            chunk = q.get()
+            if chunk is done:
+                break
+            yield chunk
+    finally:
+        cancel.set()
+    if "error" in result:
+        raise result["error"]
+    save_manifest(root, result["manifest"])
+
+
+class _Bounded(io.RawIOBase):
+    """Read-only view of the next `size` bytes of a file object."""
+
+    def __init__(self, f, size: int):
+        self.f = f
+        self.left = size
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, n: int = -1) -> bytes:
+        if self.left <= 0:
+            return b""
+        n = self.left if n is None or n < 0 else min(n, self.left)
+        data = self.f.read(n)
+        self.left -= len(data)
+        return data
+
+    def readinto(self, b) -> int:
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+def _restore_blob(root: Path, archive: Path, offset: int, size: int, members: Dict[str, Dict[str, int]]) -> int:
+    count = 0
+    with open(archive, "rb") as f:
+        f.seek(offset)
+        with tarfile.open(fileobj=_Bounded(f, size), mode="r|gz") as tar:
+            for info in tar:
+                target = (root / info.name).resolve()
+                if root not in target.parents or info.name not in members:
+                    raise ValueError(f"Unexpected archive member: {info.name}")
+                target.parent.mkdir(parents=True, exist_ok=True)
+                src = tar.extractfile(info)
+                start = members[info.name]["offset"]
+                if start:
+                    # Sizes were checked by _check_segments before anything was written
+                    with open(target, "r+b") as out:
+                        out.seek(start)
+                        while chunk := src.read(CHUNK):
+                            out.write(chunk)
+                        out.truncate()
+                else:
+                    tmp = target.with_name(target.name + ".tmp")
+                    with open(tmp, "wb") as out:
+                        while chunk := src.read(CHUNK):
+                            out.write(chunk)
+                    tmp.replace(target)
+                count += 1
+    return count
+
+
+def _read_archive(archive: Path):
+    blobs = []
+    manifest = None
+    with tarfile.open(archive, mode="r:") as tar:
+        for info in tar:
+            if info.name == "manifest.json":
+                manifest = json.load(tar.extractfile(info))
+            else:
+                blobs.append((info.offset_data, info.size))
+    if manifest is None:
+        raise ValueError(f"{archive} is not an agent-memory snapshot")
+    return manifest, blobs
+
+
+def _check_segments(root: Path, archive: Path, members: Dict[str, Dict[str, int]]):
+    """Appended segments only apply to a file that ends exactly where they start."""
+    for rel, m in members.items():
+        if not m["offset"]:
+            continue
+        try:
+            size = (root / rel).stat().st_size
+        except FileNotFoundError:
+            size = None
+        if size != m["offset"]:
+            raise ValueError(
+                f"{archive}: {rel} is {size if size is not None else 'missing'} bytes, "
+                f"but the archive appends at offset {m['offset']}"
+            )
+
+
+def restore_snapshot(root: str | Path, archives: List[str | Path], workers: int = 8) -> int:
+    """
+    Applies archives in order (a full snapshot, then its incrementals) to
+    `root`. Within an archive, repos are restored in parallel. Returns the
+    number of files written.
+
+    Every incremental must be based on the snapshot applied just before it
+    (or, for the first archive, the last one saved in `root`); the whole chain
+    is checked before anything is written. Raises ValueError otherwise.
+    """
+    root = Path(root).expanduser().resolve()
+    root.mkdir(parents=True, exist_ok=True)
+
+    try:
+        applied = load_manifest(root, "latest")["id"]
+    except FileNotFoundError:
+        applied = None
+    chain = []
+    for archive in archives:
+        archive = Path(archive).expanduser()
+        manifest, blobs = _read_archive(archive)
+        if manifest["base"] is not None and manifest["base"] != applied:
+            raise ValueError(
+                f"{archive} is an incremental on top of snapshot {manifest['base']}, "
+                f"but the state being restored is {applied or 'empty'}"
+            )
+        applied = manifest["id"]
+        chain.append((archive, manifest, blobs))
+
+    total = 0
+    for archive, manifest, blobs in chain:
+        _check_segments(root, archive, manifest["members"])
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(_restore_blob, root, archive, offset, size, manifest["members"])
+                for offset, size in blobs
+            ]
+            total += sum(f.result() for f in futures)
+        _remove_unlisted(root, manifest["files"])
+        save_manifest(root, manifest)
+    return total
+
+
+def _remove_unlisted(root: Path, files: Dict[str, Any]):
+    """Deletes files the snapshot did not contain, i.e. ones removed since its base."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        if Path(dirpath) == root:
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDED]
+        for name in filenames:
+            path = Path(dirpath) / name
+            if path.relative_to(root).as_posix() not in files:
+                path.unlink()
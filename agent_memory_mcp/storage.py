@@ -4,6 +4,20 @@ import json
 import hashlib
 import shutil
 import os
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialised within this process
+    fcntl = None
+
+from .similarity import FailureIndex
+
+# Sparse time index: one fixed-width (ts, byte offset, id) record every INDEX_STRIDE entries
+INDEX_STRIDE = 64
+INDEX_RECORD = struct.Struct("<dQQ")
 
 class Storage:
     def __init__(self, root: str | Path):
@@ -12,6 +26,10 @@ class Storage:
         self.memory_dir = self.root / "agent-memory"
         self.memory_dir.mkdir(parents=True, exist_ok=True)
         self.brain_root = Path("~/.gemini/antigravity/brain").expanduser()
+        self._lock = threading.Lock()
+        self._tails: Dict[tuple, tuple] = {}
+        self.failure_index = FailureIndex(self.root / "failure-index.jsonl")
+        self.failure_index.backfill(self.memory_dir)
 
     def resolve_repo(self, path: str | Path) -> str:
         """Finds the root of the repo (containing .git) and returns a short hash of the path."""
@@ -41,7 +59,13 @@ class Storage:
                 mapping = json.loads(map_path.read_text())
             except: pass
         mapping[repo_id] = path
-        map_path.write_text(json.dumps(mapping, indent=2))
+        self._write_atomic(map_path, json.dumps(mapping, indent=2))
+
+    def _write_atomic(self, path: Path, text: str):
+        """Replaces `path` in one step so concurrent readers and snapshots never see a torn file."""
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(text, encoding="utf-8")
+        os.replace(tmp, path)
 
     def _repo_base(self, repo_id: str) -> Path:
         base = self.memory_dir / repo_id
@@ -52,21 +76,172 @@ class Storage:
         raw_dir = self._repo_base(repo_id) / "raw-logs"
         raw_dir.mkdir(parents=True, exist_ok=True)
         target = raw_dir / log_path.name
-        shutil.copy2(log_path, target)
+        tmp = raw_dir / f"{log_path.name}.{threading.get_ident()}.tmp"
+        shutil.copy2(log_path, tmp)
+        os.replace(tmp, target)
         return target
 
-    def append_memory(self, repo_id: str, kind: str, text: str, metadata: Optional[Dict] = None) -> None:
+    def raw_log_path(self, repo_id: str, name: str) -> Path:
+        """Path of a captured raw log, refusing anything that is not a plain file name."""
+        if not name or Path(name).name != name or name.startswith(".") or name.endswith(".tmp"):
+            raise ValueError(f"Invalid log name: {name}")
+        path = self.memory_dir / repo_id / "raw-logs" / name
+        if not path.is_file():
+            raise FileNotFoundError(f"No captured log {name} for {repo_id}")
+        return path
+
+    def append_memory(self, repo_id: str, kind: str, text: str, metadata: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        Appends a structured record to memory/{kind}.jsonl and its Markdown
+        rendering to memory/{kind}.md. Records get a per-kind sequential id and
+        a non-decreasing numeric timestamp so they can be range-queried.
+        """
         mem_dir = self._repo_base(repo_id) / "memory"
         mem_dir.mkdir(parents=True, exist_ok=True)
-        path = mem_dir / f"{kind}.md"
-        
-        timestamp = metadata.get('timestamp', '---') if metadata else '---'
-        entry = f"### {timestamp}\n{text.rstrip()}\n\n"
-        with open(path, "a", encoding="utf-8") as f:
-            f.write(entry)
+        metadata = dict(metadata or {})
+
+        # The HTTP and MCP servers may share a data root, so the log itself is
+        # locked for the whole append and the cached tail is only trusted if the
+        # log still has the size this process last saw.
+        with self._lock, open(mem_dir / f"{kind}.jsonl", "ab") as f:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                offset = f.seek(0, os.SEEK_END)
+                last_id, last_ts = self._tail(repo_id, kind, Path(f.name), offset)
+                record = {
+                    "id": last_id + 1,
+                    "ts": max(time.time(), last_ts),
+                    "kind": kind,
+                    "text": text.rstrip(),
+                    "metadata": metadata,
+                }
+                data = json.dumps(record).encode("utf-8") + b"\n"
+                f.write(data)
+                f.flush()
+                if record["id"] % INDEX_STRIDE == 0:
+                    with open(mem_dir / f"{kind}.idx", "ab") as idx:
+                        idx.write(INDEX_RECORD.pack(record["ts"], offset, record["id"]))
+                self._tails[(repo_id, kind)] = (record["id"], record["ts"], offset + len(data))
+
+                timestamp = metadata.get('timestamp') or time.ctime(record["ts"])
+                entry = f"### {timestamp}\n{text.rstrip()}\n\n"
+                with open(mem_dir / f"{kind}.md", "a", encoding="utf-8") as md:
+                    md.write(entry)
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
 
         if kind == "failures":
             self._update_failure_signatures(repo_id, text)
+            self.failure_index.add(repo_id, record)
+        return record
+
+    def similar_failures(self, text: str, limit: int = 5) -> List[Dict[str, Any]]:
+        """Nearest past failures across all repos, each with the decisions recorded after it."""
+        matches = self.failure_index.search(text, limit=limit)
+        for match in matches:
+            match["decisions"] = self.query_memory(
+                match["repo_id"], "decisions", start=match["ts"], limit=3
+            )["entries"]
+        return matches
+
+    def _tail(self, repo_id: str, kind: str, log_path: Path, size: int) -> tuple:
+        """
+        Returns (id, ts) of the last record in a kind's log of `size` bytes.
+        Served from cache unless another process has appended since; otherwise
+        only the log's final line is read.
+        """
+        cached = self._tails.get((repo_id, kind))
+        if cached and cached[2] == size:
+            return cached[:2]
+        tail = (-1, 0.0)
+        if size:
+            with open(log_path, "rb") as f:
+                pos, buf = size, b""
+                while pos > 0 and buf.count(b"\n") < 2:
+                    step = min(4096, pos)
+                    pos -= step
+                    f.seek(pos)
+                    buf = f.read(step) + buf
+            lines = buf.rstrip(b"\n").rsplit(b"\n", 1)
+            if lines[-1]:
+                try:
+                    last = json.loads(lines[-1])
+                    tail = (int(last["id"]), float(last["ts"]))
+                except (ValueError, KeyError):
+                    pass
+        self._tails[(repo_id, kind)] = (*tail, size)
+        return tail
+
+    def _seek_time(self, idx_path: Path, start: float) -> int:
+        """Binary-searches the sparse index for the last checkpoint strictly before `start`."""
+        if not idx_path.exists():
+            return 0
+        with open(idx_path, "rb") as f:
+            lo, hi = 0, f.seek(0, os.SEEK_END) // INDEX_RECORD.size
+            offset = 0
+            while lo < hi:
+                mid = (lo + hi) // 2
+                f.seek(mid * INDEX_RECORD.size)
+                ts, off, _ = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+                if ts < start:
+                    offset = off
+                    lo = mid + 1
+                else:
+                    hi = mid
+        return offset
+
+    def query_memory(self, repo_id: str, kind: str, start: Optional[float] = None, end: Optional[float] = None,
+                     limit: int = 100, cursor: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Returns up to `limit` records of `kind` with start <= ts <= end, oldest first.
+        `cursor` is the opaque `next_cursor` of a previous page (a byte offset into the log).
+        """
+        mem_dir = self._repo_base(repo_id) / "memory"
+        log_path = mem_dir / f"{kind}.jsonl"
+        result = {"entries": [], "next_cursor": None}
+        if not log_path.exists():
+            return result
+
+        if cursor:
+            try:
+                offset = int(cursor)
+            except ValueError:
+                raise ValueError(f"Invalid cursor: {cursor}")
+        elif start is not None:
+            offset = self._seek_time(mem_dir / f"{kind}.idx", start)
+        else:
+            offset = 0
+
+        with open(log_path, "rb") as f:
+            if cursor:
+                # A cursor must point at the start of a record: offset 0 or just past a newline
+                if offset < 0 or offset > os.fstat(f.fileno()).st_size:
+                    raise ValueError(f"Invalid cursor: {cursor}")
+                if offset > 0:
+                    f.seek(offset - 1)
+                    if f.read(1) != b"\n":
+                        raise ValueError(f"Invalid cursor: {cursor}")
+            f.seek(offset)
+            while len(result["entries"]) < limit:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    # EOF, or a record still being written
+                    break
+                offset += len(line)
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if start is not None and record["ts"] < start:
+                    continue
+                if end is not None and record["ts"] > end:
+                    return result
+                result["entries"].append(record)
+            if len(result["entries"]) == limit and f.read(1):
+                result["next_cursor"] = str(offset)
+        return result
 
     def _update_failure_signatures(self, repo_id: str, text: str):
         sig_path = self._repo_base(repo_id) / "failure_signatures.json"
@@ -81,7 +256,7 @@ class Storage:
             sig = lines[0][:100]
             if sig not in sigs:
                 sigs.append(sig)
-                sig_path.write_text(json.dumps(sigs, indent=2))
+                self._write_atomic(sig_path, json.dumps(sigs, indent=2))
 
     def read_memory(self, repo_id: str) -> Dict[str, Any]:
         if repo_id == "agent-brain":
@@ -1,54 +1,233 @@
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 from pathlib import Path
+import os
 import queue
 import time
 import threading
 
+from .ignore import IgnoreMatcher
+from .file_index import FileIndex
+from . import inotify
+
+class PendingQueue(queue.Queue):
+    """Queue that skips a path already waiting in it, so a file reported both live and by catch_up is ingested once."""
+
+    def _init(self, maxsize):
+        super()._init(maxsize)
+        self._pending = set()
+
+    def _put(self, item):
+        if item in self._pending:
+            return
+        self._pending.add(item)
+        super()._put(item)
+
+    def _get(self):
+        item = super()._get()
+        self._pending.discard(item)
+        return item
+
 class WatcherHandler(FileSystemEventHandler):
-    def __init__(self, q: queue.Queue, extensions: set, ignore_patterns: set):
+    def __init__(self, q: queue.Queue, extensions: set, matcher: IgnoreMatcher, on_new_dir=None, on_gone_dir=None,
+                 pruned: bool = True):
         self.q = q
         self.extensions = extensions
-        self.ignore_patterns = ignore_patterns
+        self.matcher = matcher
+        self.pruned = pruned
+        self.on_new_dir = on_new_dir
+        self.on_gone_dir = on_gone_dir
 
     def on_modified(self, event):
         if event.is_directory:
             return
         
         path = Path(event.src_path)
-        
-        # Check ignores
-        if any(p in str(path) for p in self.ignore_patterns):
+        if path.suffix not in self.extensions:
             return
 
-        if path.suffix in self.extensions:
+        if not self.pruned:
+            if not self.matcher.is_ignored(path):
+                self.q.put(path)
+            return
+
+        # Watches only exist on kept directories, so just the file itself needs checking
+        try:
+            rel = path.relative_to(self.matcher.root).as_posix()
+        except ValueError:
+            return
+        if not self.matcher.is_ignored_entry(rel, False):
             self.q.put(path)
 
+    def on_created(self, event):
+        if event.is_directory and self.on_new_dir:
+            self.on_new_dir(self.matcher, Path(event.src_path))
+
+    def on_deleted(self, event):
+        if event.is_directory and self.on_gone_dir:
+            self.on_gone_dir(Path(event.src_path))
+
+    def on_moved(self, event):
+        if not event.is_directory:
+            return
+        if self.on_gone_dir:
+            self.on_gone_dir(Path(event.src_path))
+        if self.on_new_dir:
+            self.on_new_dir(self.matcher, Path(event.dest_path))
+
+def walk_kept_dirs(matcher: IgnoreMatcher, start: Path):
+    """Yields every directory under `start` that is not ignored, pruning ignored subtrees."""
+    stack = [start]
+    while stack:
+        d = stack.pop()
+        yield d
+        try:
+            with os.scandir(d) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        if any(e.name == ".gitignore" and e.is_file() for e in entries) and d != matcher.root:
+            matcher.add_gitignore(Path(d) / ".gitignore")
+        for e in entries:
+            try:
+                if not e.is_dir(follow_symlinks=False):
+                    continue
+            except OSError:
+                continue
+            rel = Path(e.path).relative_to(matcher.root).as_posix()
+            if not matcher.is_ignored_entry(rel, True):
+                stack.append(Path(e.path))
+
 class FileWatcher:
-    def __init__(self, paths: list, extensions: list, ignore_patterns: list = None):
-        self.q = queue.Queue()
+    def __init__(self, paths: list, extensions: list, ignore_patterns: list = None, index_dir: str | Path = None):
+        self.q = PendingQueue()
         self.extensions = set(extensions)
         self.ignore_patterns = set(ignore_patterns or [".git", "node_modules", "__pycache__", ".venv"])
-        self.paths = [Path(p).expanduser() for p in paths]
-        self.observer = Observer()
-        self.handler = WatcherHandler(self.q, self.extensions, self.ignore_patterns)
+        self.paths = [Path(p).expanduser().resolve() for p in paths]
+        self.observer = None
+        self._recovering = False
+        if inotify.available():
+            try:
+                self.observer = inotify.InotifyObserver(on_overflow=self._on_overflow)
+            except OSError as e:
+                print(f"[WATCHER] inotify unavailable ({e}); falling back to recursive watches")
+        self.pruned = self.observer is not None
+        if self.observer is None:
+            self.observer = Observer()
+        self.matchers = {}
+        self._handlers = {}
+        self._watches = {}
+        self._lock = threading.Lock()
+        self.indexes = {}
         
         for p in self.paths:
             if p.exists():
-                self.observer.schedule(self.handler, str(p), recursive=True)
+                matcher = IgnoreMatcher(p, self.ignore_patterns)
+                self.matchers[p] = matcher
+                if self.pruned:
+                    self._handlers[p] = WatcherHandler(
+                        self.q, self.extensions, matcher, self._schedule_tree, self._unschedule_tree
+                    )
+                    self._schedule_tree(matcher, p)
+                else:
+                    # Without a shared inotify instance, one emitter per directory would exhaust
+                    # the instance limit; watch the root recursively and filter events instead.
+                    self._handlers[p] = WatcherHandler(self.q, self.extensions, matcher, pruned=False)
+                    self.observer.schedule(self._handlers[p], str(p), recursive=True)
+                if index_dir:
+                    self.indexes[p] = FileIndex(index_dir, p)
 
         self._running = False
 
-    def start(self):
+    def _schedule_tree(self, matcher: IgnoreMatcher, start: Path):
+        """Adds one watch descriptor per kept directory, so ignored subtrees never cost a watch."""
+        if start != matcher.root and matcher.is_ignored(start, is_dir=True):
+            return
+        handler = self._handlers[matcher.root]
+        with self._lock:
+            for d in walk_kept_dirs(matcher, start):
+                key = str(d)
+                if key in self._watches:
+                    continue
+                try:
+                    self._watches[key] = self.observer.schedule(handler, key, recursive=False)
+                except OSError as e:
+                    print(f"[WATCHER] Could not watch {key}: {e}")
+
+    def _unschedule_tree(self, start: Path):
+        prefix = str(start)
+        with self._lock:
+            for key in [k for k in self._watches if k == prefix or k.startswith(prefix + os.sep)]:
+                watch = self._watches.pop(key)
+                try:
+                    self.observer.unschedule(watch)
+                except (KeyError, OSError):
+                    pass
+
+    def _on_overflow(self):
+        """Called from the inotify reader; recovers on a separate thread so reading resumes at once."""
+        with self._lock:
+            if self._recovering or not self._running:
+                return
+            self._recovering = True
+        threading.Thread(target=self._recover, name="watcher-recover", daemon=True).start()
+
+    def _recover(self):
+        """Rebuilds the watch set and re-queues changed files after events were lost."""
+        try:
+            # Directory deletions may have been dropped; forget watches the kernel already removed
+            live = self.observer.watches()
+            with self._lock:
+                for key in [k for k, wd in self._watches.items() if wd not in live]:
+                    del self._watches[key]
+            for root, matcher in self.matchers.items():
+                self._schedule_tree(matcher, root)
+            queued = self.catch_up()
+            print(f"[WATCHER] Rescanned after overflow; {queued} changed file(s) queued")
+        finally:
+            self._recovering = False
+
+    def _index_for(self, path: Path):
+        for root, index in self.indexes.items():
+            if path == root or root in path.parents:
+                return index
+        return None
+
+    def catch_up(self) -> int:
+        """Queues files that changed since the last run, as recorded by the per-root indexes."""
+        total = 0
+        for root, index in self.indexes.items():
+            # Fresh matcher: the walk loads nested .gitignore files into it
+            matcher = IgnoreMatcher(root, self.ignore_patterns)
+            for path in index.reconcile(matcher, self.extensions):
+                self.q.put(path)
+                total += 1
+        return total
+
+    def mark_ingested(self, path: Path):
+        index = self._index_for(path)
+        if index:
+            index.mark_ingested(path)
+
+    def start(self) -> bool:
+        """Starts the observer; returns False (after logging why) if it could not be started."""
         if not self._running:
-            self.observer.start()
+            try:
+                self.observer.start()
+            except OSError as e:
+                print(f"[WATCHER] Could not start observer: {e}")
+                return False
             self._running = True
+        return True
 
     def stop(self):
         if self._running:
             self.observer.stop()
             self.observer.join()
             self._running = False
+        indexes, self.indexes = self.indexes, {}
+        for index in indexes.values():
+            index.close()
 
     def events(self):
         """Generator that yields events from the queue."""
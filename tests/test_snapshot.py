@@ -0,0 +1,129 @@
+import filecmp
+import os
+
+import pytest
+
+from agent_memory_mcp.storage import Storage
+from agent_memory_mcp.snapshot import (
+    load_manifest,
+    restore_snapshot,
+    save_manifest,
+    write_snapshot,
+)
+
+
+def _snapshot(root, out, since=None):
+    with open(out, "wb") as f:
+        manifest = write_snapshot(root, f, since)
+    save_manifest(root, manifest)
+    return manifest
+
+
+def _tree(root):
+    found = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        if dirpath == str(root):
+            dirnames[:] = [d for d in dirnames if d not in ("snapshots", "watch-index")]
+        for name in filenames:
+            path = os.path.join(dirpath, name)
+            with open(path, "rb") as f:
+                found[os.path.relpath(path, root)] = f.read()
+    return found
+
+
+@pytest.fixture
+def populated(tmp_path):
+    src = tmp_path / "src"
+    store = Storage(src)
+    for i in range(30):
+        store.append_memory(f"repo{i % 3}", "failures", f"build failed: step {i}")
+        store.append_memory(f"repo{i % 3}", "decisions", f"pin dependency {i}")
+    log = tmp_path / "build.log"
+    log.write_bytes(b"compiling\n" * 50000)
+    store.capture_raw_log("repo1", log)
+    return src, store
+
+
+def test_full_then_incremental_restores_identical_tree(tmp_path, populated):
+    src, store = populated
+    full = _snapshot(src, tmp_path / "full.tar")
+
+    store.append_memory("repo2", "failures", "linker error")
+    os.unlink(src / "agent-memory" / "repo1" / "raw-logs" / "build.log")
+    inc = _snapshot(src, tmp_path / "inc.tar", load_manifest(src, full["id"]))
+    assert inc["base"] == full["id"]
+    assert inc["members"]["agent-memory/repo2/memory/failures.jsonl"]["offset"] > 0
+
+    dst = tmp_path / "dst"
+    restore_snapshot(dst, [tmp_path / "full.tar", tmp_path / "inc.tar"])
+    assert _tree(dst) == _tree(src)
+
+    restored = Storage(dst)
+    assert restored.append_memory("repo2", "failures", "next")["id"] == 11
+
+
+def test_incremental_alone_is_rejected(tmp_path, populated):
+    src, store = populated
+    full = _snapshot(src, tmp_path / "full.tar")
+    store.append_memory("repo0", "failures", "more")
+    _snapshot(src, tmp_path / "inc.tar", load_manifest(src, full["id"]))
+
+    dst = tmp_path / "dst"
+    with pytest.raises(ValueError):
+        restore_snapshot(dst, [tmp_path / "inc.tar"])
+    assert _tree(dst) == {}
+
+
+def test_out_of_order_archives_are_rejected(tmp_path, populated):
+    src, store = populated
+    full = _snapshot(src, tmp_path / "full.tar")
+    store.append_memory("repo0", "failures", "one")
+    inc1 = _snapshot(src, tmp_path / "inc1.tar", load_manifest(src, full["id"]))
+    store.append_memory("repo0", "failures", "two")
+    _snapshot(src, tmp_path / "inc2.tar", load_manifest(src, inc1["id"]))
+
+    dst = tmp_path / "dst"
+    with pytest.raises(ValueError):
+        restore_snapshot(dst, [tmp_path / "inc1.tar", tmp_path / "full.tar"])
+    with pytest.raises(ValueError):
+        restore_snapshot(dst, [tmp_path / "full.tar", tmp_path / "inc2.tar", tmp_path / "inc1.tar"])
+    assert _tree(dst) == {}
+
+    restore_snapshot(dst, [tmp_path / "full.tar", tmp_path / "inc1.tar", tmp_path / "inc2.tar"])
+    assert _tree(dst) == _tree(src)
+
+
+def test_segment_onto_mismatched_file_is_rejected(tmp_path, populated):
+    src, store = populated
+    full = _snapshot(src, tmp_path / "full.tar")
+    store.append_memory("repo0", "failures", "appended")
+    _snapshot(src, tmp_path / "inc.tar", load_manifest(src, full["id"]))
+
+    dst = tmp_path / "dst"
+    restore_snapshot(dst, [tmp_path / "full.tar"])
+    log = dst / "agent-memory" / "repo0" / "memory" / "failures.jsonl"
+    log.write_bytes(log.read_bytes()[:-5])
+    with pytest.raises(ValueError):
+        restore_snapshot(dst, [tmp_path / "inc.tar"])
+    assert not log.read_bytes().startswith(b"\x00")
+
+
+def test_file_replaced_between_plan_and_build(tmp_path, populated, monkeypatch):
+    from agent_memory_mcp import snapshot
+
+    src, store = populated
+    replacement = tmp_path / "build.log"
+    original_build = snapshot._build_blob
+
+    def replace_then_build(*args):
+        replacement.write_text("short\n")
+        store.capture_raw_log("repo1", replacement)
+        return original_build(*args)
+
+    monkeypatch.setattr(snapshot, "_build_blob", replace_then_build)
+    _snapshot(src, tmp_path / "full.tar")
+
+    dst = tmp_path / "dst"
+    restore_snapshot(dst, [tmp_path / "full.tar"])
+    rel = os.path.join("agent-memory", "repo1", "raw-logs", "build.log")
+    assert filecmp.cmp(src / rel, dst / rel, shallow=False)